@@ -1,45 +1,164 @@
-import matplotlib.pyplot as plt
+import argparse
+import atexit
+import datetime
+import sys
 import numpy as np
 import pandas as pd
 import requests
 
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Iterable
-from datetime import datetime, timedelta
+from datetime import timedelta
+from pathlib import Path
 
-pd.options.mode.copy_on_write = True
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-class Date:
+try:
+    import requests_cache
+except ImportError:
+    requests_cache = None
 
-    def __init__(self, year: int, month: int, day: int) -> None:
-        self.year = year
-        self.month = month
-        self.day = day
+pd.options.mode.copy_on_write = True
 
-    def to_string(self) -> str:
-        return f"{self.year}-{self.month:02d}-{self.day:02d}"
+API_TIMEOUT = 10
+API_USER_AGENT = f"bmrs-imbalance-daily-report {requests.utils.default_user_agent()}"
 
-    def yesterday(self) -> 'Date':
-        today = datetime(self.year, self.month, self.day)
-        yesterday = today - timedelta(days=1)
-        return Date.from_datetime(yesterday)
+# Anchored to this file's directory, so the cache doesn't depend on the working directory the script is run from
+API_CACHE_NAME = Path(__file__).parent / "elexon_cache"
+API_CACHE_EXPIRE_AFTER = timedelta(days=7)
+API_CACHE_RECENT_EXPIRE_AFTER = timedelta(hours=1)
 
-    def tomorrow(self) -> 'Date':
-        today = datetime(self.year, self.month, self.day)
-        tomorrow = today + timedelta(days=1)
-        return Date.from_datetime(tomorrow)
+NANOSECONDS_PER_HOUR = 3_600_000_000_000
 
-    @classmethod
-    def from_string(cls, date_string: str) -> 'Date':
-        year, month, day = date_string.split("-")
-        return cls(int(year), int(month), int(day))
+COLUMNS_OF_INTEREST = ['settlementDate', 'settlementPeriod', 'startTime', 'createdDateTime', 'systemSellPrice', 'systemBuyPrice', 'netImbalanceVolume']
 
-    @classmethod
-    def from_datetime(cls, date_time: datetime) -> 'Date':
-        return cls(date_time.year, date_time.month, date_time.day)
+SETTLEMENT_PERIOD_OFFSETS = pd.timedelta_range(start=0, periods=48, freq='30min')
 
 ## Data retrieval and processing functions
 
-def fetch_data_from_api_for_date_string(date: str) -> pd.DataFrame | None:
+def create_api_session() -> requests.Session:
+    '''
+    Create the HTTP session used for all Elexon Insights API requests.
+
+    If requests-cache is installed, responses are cached on disk in a SQLite database 
+    (elexon_cache.sqlite, next to this file), keyed on the request URL, so repeated runs for the same date do not hit the API again.
+    Cached responses are served past their expiry if the API is unavailable.
+    Responses without any records are dropped from the cache again (see forget_cached_api_response).
+
+    The session identifies itself with API_USER_AGENT, keeps connections to the API alive between requests, 
+    requests compressed responses, and retries rate limited (429) and server error (5xx) responses with exponential backoff.
+
+    Returns:
+    requests.Session
+        A requests_cache.CachedSession if requests-cache is installed; otherwise, a plain requests.Session.
+    '''
+    if requests_cache is None:
+        session = requests.Session()
+    else:
+        session = requests_cache.CachedSession(API_CACHE_NAME, backend="sqlite", expire_after=API_CACHE_EXPIRE_AFTER, stale_if_error=True)
+
+    # Advertise every compression scheme urllib3 can decode here (brotli/zstd only if their packages are installed).
+    session.headers.update(make_headers(accept_encoding=True))
+    session.headers['User-Agent'] = API_USER_AGENT
+
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retry))
+
+    return session
+
+
+_SESSION = create_api_session()
+atexit.register(_SESSION.close)
+
+
+def forget_cached_api_response(response : requests.Response) -> None:
+    '''
+    Remove an API response from the on-disk cache, if requests-cache is installed.
+
+    Settled dates never expire from the cache, so a response without records (e.g. data not yet published) 
+    must be removed, or it would be served forever. This is decided after the body has been parsed once, 
+    rather than by parsing every response again in a requests-cache filter.
+
+    Parameters:
+    response : requests.Response
+        A response from the Elexon Insights API.
+    '''
+    if requests_cache is not None:
+        _SESSION.cache.delete(urls=[response.url])
+
+
+def api_cache_expire_after(date_string : str) -> timedelta | int:
+    '''
+    Choose how long the cached API response for a given settlement date stays fresh.
+
+    Data for settlement dates before yesterday is settled and no longer changes, so it never expires. 
+    Data for yesterday, today or later may still be incomplete, so it expires after API_CACHE_RECENT_EXPIRE_AFTER.
+
+    Parameters:
+    date_string : str
+        The settlement date, formatted as 'yyyy-mm-dd'.
+
+    Returns:
+    timedelta or int
+        The expiry to pass to requests-cache; requests_cache.NEVER_EXPIRE for settled dates. 
+        Strings that are not valid dates fall back to API_CACHE_EXPIRE_AFTER.
+    '''
+    try:
+        settlement_date = datetime.date.fromisoformat(date_string)
+    except ValueError:
+        return API_CACHE_EXPIRE_AFTER
+
+    if settlement_date < datetime.date.today() - timedelta(days=1):
+        return requests_cache.NEVER_EXPIRE
+
+    return API_CACHE_RECENT_EXPIRE_AFTER
+
+
+def is_valid_date_string(date_string : str) -> bool:
+    '''
+    Check whether a string is a real calendar date formatted as 'yyyy-mm-dd'.
+
+    Parameters:
+    date_string : str
+        The string to check.
+
+    Returns:
+    bool
+        True if the string is a valid 'yyyy-mm-dd' date; otherwise, False.
+    '''
+    try:
+        return datetime.date.fromisoformat(date_string).isoformat() == date_string
+    except ValueError:
+        return False
+
+
+def offset_date_string(date_string : str, days : int) -> str:
+    '''
+    Shift a settlement date by a number of days, e.g. to get the previous or next settlement date.
+
+    All neighbouring dates are worked out here, so the date strings used to fetch (and memoize) 
+    neighbouring data always match.
+
+    Parameters:
+    date_string : str
+        The settlement date, formatted as 'yyyy-mm-dd'.
+    days : int
+        The number of days to shift by; negative for earlier dates.
+
+    Returns:
+    str
+        The shifted settlement date, formatted as 'yyyy-mm-dd'.
+    '''
+    return (datetime.date.fromisoformat(date_string) + timedelta(days=days)).isoformat()
+
+
+def fetch_data_from_api_for_date_string(date: str, columns: Iterable[str] | None = None) -> pd.DataFrame | None:
     '''
     Fetch BMRS Imbalance data from Elexon Insights API for a given settlement date.
 
@@ -48,34 +167,54 @@ def fetch_data_from_api_for_date_string(date: str) -> pd.DataFrame | None:
         The settlement date for which to fetch the data, formatted as 'yyyy-mm-dd'.
         The settlement date is in local time, i.e Greenwich Mean Time (GMT) or British Summer Time (BST).
 
+    columns : Iterable[str] or None
+        If given, only these fields of the API response are used to build the DataFrame 
+        (any that the API did not return are left out). Otherwise, all fields are included.
+
     Returns:
     pd.DataFrame or None
         A Pandas DataFrame containing the system price data for the specified 
-        date if the request was successful; otherwise, returns None. 
+        date if the request was successful; otherwise (including timeouts and connection errors), returns None. 
         Columns containing times are in Coordinated Universal Time (UTC).
     '''
-    response = requests.get(f"https://data.elexon.co.uk/bmrs/api/v1/balancing/settlement/system-prices/{date}?format=json")
-    
+    if not is_valid_date_string(date):
+        print(f"Error: invalid date: {date}")
+        return None
+
+    request_options = {'timeout': API_TIMEOUT}
+    if requests_cache is not None:
+        request_options['expire_after'] = api_cache_expire_after(date)
+
+    try:
+        response = _SESSION.get(f"https://data.elexon.co.uk/bmrs/api/v1/balancing/settlement/system-prices/{date}?format=json", **request_options)
+    except requests.RequestException as error:
+        # Timeouts, and connection errors once the retries are used up
+        print("Error: ", error)
+        return None
+
     if response.status_code == 200:
-        data = response.json()['data']
-        data = pd.DataFrame(data)
-        if data.shape[0] > 0:
-            return data
+        payload = orjson.loads(response.content) if orjson is not None else response.json()
+        records = payload['data']
+        if len(records) > 0:
+            fields = records[0].keys() if columns is None else [column for column in columns if column in records[0]]
+            data = {field: [record.get(field) for record in records] for field in fields}
+            return pd.DataFrame(data)
         else:
             print(f"Error: no data for date: {date}")
+            forget_cached_api_response(response)
             return None
     else:
         print("Error: ", response.status_code)
         return None
     
 
-def fetch_data_from_api_for_date(date: Date) -> pd.DataFrame | None:
+def fetch_data_from_api_for_date(date: datetime.date) -> pd.DataFrame | None:
     '''
     Fetch BMRS Imbalance data from Elexon Insights API for a given settlement date.
 
     Parameters:
-    date : Date
-        The settlement date for which to fetch the data as Date class.
+    date : datetime.date
+        The settlement date for which to fetch the data.
 
     Returns:
     pd.DataFrame or None
@@ -83,7 +222,7 @@ def fetch_data_from_api_for_date(date: Date) -> pd.DataFrame | None:
         date if the request was successful; otherwise, returns None.
     '''
 
-    return fetch_data_from_api_for_date_string(date.to_string())
+    return fetch_data_from_api_for_date_string(date.isoformat())
 
 
 def transform_data_from_api(df: pd.DataFrame) -> pd.DataFrame | None:
@@ -104,8 +243,7 @@ def transform_data_from_api(df: pd.DataFrame) -> pd.DataFrame | None:
         A DataFrame containing the filtered and transformed data with relevant date columns
         converted to datetime format. Returns None if the input DataFrame is empty or invalid.
     """
-    columns_of_interest = ['settlementDate', 'settlementPeriod', 'startTime', 'createdDateTime', 'systemSellPrice', 'systemBuyPrice', 'netImbalanceVolume']
-    filtered_data = df[columns_of_interest]
+    filtered_data = df[COLUMNS_OF_INTEREST]
 
     transformed_data = transform_date_columns_to_datetime(filtered_data)
 
@@ -118,7 +256,11 @@ def fetch_and_transform_data_for_date_string(date_string : str) -> pd.DataFrame
 
     This function retrieves data using the provided date string (formatted as 'yyyy-mm-dd'),
     filters the DataFrame to include only the specified columns of interest, 
-    and converts relevant date columns to datetime format.
+    converts relevant date columns to datetime format, and stores 'settlementPeriod' as int16.
+
+    Results are memoized per date string for the lifetime of the process, so a date that is 
+    needed again (e.g. as the neighbour of another settlement date) is not refetched. 
+    Each call returns its own copy, so callers can add columns without affecting the cache.
 
     Parameters:
     date_string : str
@@ -130,19 +272,60 @@ def fetch_and_transform_data_for_date_string(date_string : str) -> pd.DataFrame
         converted to datetime format if the data was successfully retrieved; otherwise, returns None.
     """
     
-    df = fetch_data_from_api_for_date_string(date_string)
+    try:
+        df = _fetch_and_transform_data_for_date_string_cached(date_string)
+    except LookupError:
+        return None
 
-    if df is not None:
-        transformed_data = transform_data_from_api(df)
-        return transformed_data
-    
-    return None
+    return df.copy(deep=False)
+
+
+@lru_cache(maxsize=64)
+def _fetch_and_transform_data_for_date_string_cached(date_string : str) -> pd.DataFrame:
+    # Failed fetches raise instead of returning None, so lru_cache does not keep them and the date is retried next time.
+    df = fetch_data_from_api_for_date_string(date_string, columns=COLUMNS_OF_INTEREST)
+
+    if df is None:
+        raise LookupError(f"No data fetched for date: {date_string}")
+
+    transformed_data = transform_data_from_api(df)
+    transformed_data = transformed_data.astype({'settlementPeriod': 'int16'})
+    return transformed_data
+
+
+def fetch_and_transform_data_for_date_strings(date_strings : Iterable[str]) -> list[pd.DataFrame | None]:
+    """
+    Fetch and transform data for several dates concurrently.
+
+    The API requests are I/O bound, so they are issued from a thread pool and the 
+    total wait is roughly that of the slowest single request rather than the sum of all of them.
+
+    Parameters:
+    date_strings : Iterable[str]
+        The date strings used to fetch data from the API, formatted as 'yyyy-mm-dd'.
+
+    Returns:
+    list[pd.DataFrame | None]:
+        The result of fetch_and_transform_data_for_date_string for each date string, in the same order.
+    """
+    date_strings = list(date_strings)
+
+    with ThreadPoolExecutor(max_workers=max(len(date_strings), 1)) as executor:
+        return list(executor.map(fetch_and_transform_data_for_date_string, date_strings))
 
 
 def transform_date_columns_to_datetime(df : pd.DataFrame) -> pd.DataFrame:
-    date_columns = ['settlementDate', 'startTime', 'createdDateTime']
-    df[date_columns] = df[date_columns].apply(pd.to_datetime)
-    return df
+    parsed_columns = {
+        'settlementDate': pd.to_datetime(df['settlementDate'], format='%Y-%m-%d', cache=True),
+        'startTime': pd.to_datetime(df['startTime'], format='ISO8601', utc=True, cache=True),
+        'createdDateTime': pd.to_datetime(df['createdDateTime'], format='ISO8601', utc=True, cache=True),
+    }
+
+    return df.assign(**parsed_columns)
+
+
+def to_utc_nanoseconds(times : pd.Series | pd.DatetimeIndex) -> np.ndarray:
+    return times.to_numpy(dtype='datetime64[ns]').view(np.int64)
 
 
 def switch_timezone_to_utc(date_string : str, df : pd.DataFrame) -> pd.DataFrame:
@@ -166,14 +349,22 @@ def switch_timezone_to_utc(date_string : str, df : pd.DataFrame) -> pd.DataFrame
     """
 
     expected_start_times = generate_expected_start_times(date_string)
-    filtered_data = df[df['startTime'].isin(expected_start_times)]
+    expected_start_times_ns = to_utc_nanoseconds(expected_start_times)
+    start_times_ns = to_utc_nanoseconds(df['startTime'])
 
-    missing_times = expected_start_times[~expected_start_times.isin(df['startTime'])]
+    positions = np.searchsorted(expected_start_times_ns, start_times_ns).clip(max=len(expected_start_times_ns) - 1)
+    is_expected_start_time = expected_start_times_ns[positions] == start_times_ns
+    filtered_data = df[is_expected_start_time]
+
+    is_found = np.zeros(len(expected_start_times), dtype=bool)
+    is_found[positions[is_expected_start_time]] = True
+    missing_times = expected_start_times[~is_found]
 
     if len(missing_times) > 0 :
         filtered_data = add_missing_settlement_periods(date_string, filtered_data, missing_times)
 
-        missing_times = expected_start_times[~expected_start_times.isin(filtered_data['startTime'])]
+        is_found = np.isin(expected_start_times_ns, to_utc_nanoseconds(filtered_data['startTime']))
+        missing_times = expected_start_times[~is_found]
         if len(missing_times) > 0:
             print("Settlement date is missing settlement periods.")
             print(missing_times)
@@ -181,10 +372,34 @@ def switch_timezone_to_utc(date_string : str, df : pd.DataFrame) -> pd.DataFrame
     return filtered_data
 
 
+def ends_in_british_summer_time(date_string : str) -> bool:
+    '''
+    Check whether UK local time is ahead of UTC at the end of the given (UTC) date.
+
+    When it is (BST), the final settlement periods of the UTC date are published by the API 
+    under the next local settlement date.
+
+    Parameters:
+    date_string : str
+        The date string in "yyyy-mm-dd" format representing the settlement date.
+
+    Returns:
+    bool
+        True if the UK is observing British Summer Time at midnight (UTC) ending the given date.
+    '''
+    end_of_day = pd.Timestamp(date_string, tz='UTC') + pd.Timedelta(days=1)
+
+    return end_of_day.tz_convert('Europe/London').utcoffset() > timedelta(0)
+
+
+@lru_cache(maxsize=365)
 def generate_expected_start_times(date: str) -> pd.DatetimeIndex:
     '''
     Generate series of expected settlement period start times for given date.
 
+    The series is built by shifting a fixed template of 48 half hour offsets to midnight (UTC)
+    of the given date, and is cached per date string (DatetimeIndex is immutable, so sharing it is safe).
+
     Parameters:
     date : str
         The settlement date for which to generate the series, formatted as 'yyyy-mm-dd'.
@@ -193,11 +408,9 @@ def generate_expected_start_times(date: str) -> pd.DatetimeIndex:
     pd.DatetimeIndex
         A Pandas DatetimeIndex containing series of timeslots at half hour intervals.
     '''
-    start = f'{date} 00:00:00'  
-    end = f'{date} 23:30:00'    
-    interval = '0.5h'                     
+    start = pd.Timestamp(date, tz='UTC')
 
-    date_series = pd.date_range(start=start, end=end, freq=interval, tz='UTC')
+    date_series = start + SETTLEMENT_PERIOD_OFFSETS
 
     return date_series
 
@@ -207,8 +420,10 @@ def add_missing_settlement_periods(settlement_date : str, settlement_date_df : p
     Fetch data for missing settlement periods by checking previous and next settlement dates in API.
     Combine with data saved under correct settlement date.
 
-    This function retrieves data for the previous and following days, 
+    This function retrieves data for the previous and following days concurrently, 
     and checks if any of the periods belong to the required settlement date. 
+    Only the neighbouring days that could hold the missing periods are fetched: 
+    yesterday for periods before 12:00 (UTC), tomorrow for periods from 12:00 (UTC).
     It combines the DataFrames into a single DataFrame for further analysis.
 
     Parameters:
@@ -229,40 +444,51 @@ def add_missing_settlement_periods(settlement_date : str, settlement_date_df : p
         A DataFrame containing the combined data for the settlement date. 
         Note: it is not guaranteed that all settlement periods were found
     """
-    date = Date.from_string(settlement_date)
+    yesterday = offset_date_string(settlement_date, -1)
+    tomorrow = offset_date_string(settlement_date, 1)
 
-    yesterday_df = fetch_and_transform_data_for_date_string(date.yesterday().to_string())
+    neighbour_dates = []
+    if (missing_settlement_times.hour < 12).any():
+        neighbour_dates.append(yesterday)
+    if (missing_settlement_times.hour >= 12).any():
+        neighbour_dates.append(tomorrow)
 
-    misplaced_periods_yesterday = yesterday_df[yesterday_df['startTime'].isin(missing_settlement_times)]
+    neighbour_dfs = dict(zip(neighbour_dates, fetch_and_transform_data_for_date_strings(neighbour_dates)))
+    yesterday_df = neighbour_dfs.get(yesterday)
+    tomorrow_df = neighbour_dfs.get(tomorrow)
 
-    tomorrow_df = fetch_and_transform_data_for_date_string(date.tomorrow().to_string())
+    missing_settlement_times_ns = to_utc_nanoseconds(missing_settlement_times)
+
+    frames = [settlement_date_df]
+
+    if yesterday_df is not None:
+        misplaced_periods_yesterday = yesterday_df[np.isin(to_utc_nanoseconds(yesterday_df['startTime']), missing_settlement_times_ns)]
+        if misplaced_periods_yesterday.shape[0] > 0:
+            frames.insert(0, misplaced_periods_yesterday)
 
     if tomorrow_df is not None:
-        
-        misplaced_periods_tomorrow = tomorrow_df[tomorrow_df['startTime'].isin(missing_settlement_times)]
+        misplaced_periods_tomorrow = tomorrow_df[np.isin(to_utc_nanoseconds(tomorrow_df['startTime']), missing_settlement_times_ns)]
+        if misplaced_periods_tomorrow.shape[0] > 0:
+            frames.append(misplaced_periods_tomorrow)
 
-        if misplaced_periods_yesterday.shape[0] > 0 :
-            combined_df = pd.concat([misplaced_periods_yesterday, settlement_date_df, misplaced_periods_tomorrow], axis=0)
-        else:
-            combined_df = pd.concat([settlement_date_df, misplaced_periods_tomorrow], axis=0)
+    if len(frames) == 1:
+        return settlement_date_df
 
-    elif misplaced_periods_yesterday.shape[0] > 0:
-        combined_df = pd.concat([misplaced_periods_yesterday, settlement_date_df], axis=0)
-    else:
-        combined_df = settlement_date_df
+    combined_df = pd.concat(frames, axis=0, ignore_index=True)
     
     return combined_df
 
 
 
 ## Plotting functions
-def generate_price_and_imbalance_cost_plots_from_dataframe(settlement_date : str, df : pd.DataFrame) -> None:
-    df['Time'] = df.apply(lambda row: f"{row['startTime'].hour:02d}:{row['startTime'].minute:02d}", axis = 1)
+def generate_price_and_imbalance_cost_plots_from_dataframe(settlement_date : str, df : pd.DataFrame, output_path : str | None = None) -> None:
+    df['Time'] = df['startTime'].dt.strftime('%H:%M')
+    df['ImbalanceCost'] = calculate_imbalance_cost(df)
 
-    return generate_price_and_imbalance_cost_plots(settlement_date, df['Time'], df['systemSellPrice'], df['ImbalanceCost'])
+    return generate_price_and_imbalance_cost_plots(settlement_date, df['Time'].to_numpy(), df['systemSellPrice'].to_numpy(), df['ImbalanceCost'].to_numpy(), output_path)
 
 
-def generate_price_and_imbalance_cost_plots(settlement_date : str, time: Iterable[float], sell_price: Iterable[float], imbalance_cost: Iterable[float],) -> None:
+def generate_price_and_imbalance_cost_plots(settlement_date : str, time: np.ndarray, sell_price: np.ndarray, imbalance_cost: np.ndarray, output_path : str | None = None) -> None:
     """
     Generates and displays two plots: one for the system price and another for the imbalance cost
     for a specified settlement date. Each plot includes annotations for the maximum values.
@@ -271,36 +497,53 @@ def generate_price_and_imbalance_cost_plots(settlement_date : str, time: Iterabl
     settlement_date : str
         A string representing the date of the settlement in the format 'yyyy-mm-dd'.
     
-    time : Iterable[float]
-        An iterable containing the time points (e.g., timestamps) 
+    time : np.ndarray
+        An array containing the time points (e.g., timestamps or 'HH:MM' labels) 
         for the x-axis of the plots. This represents the settlement period start times in UTC.
     
-    sell_price : Iterable[float]
-        An iterable containing the system sell prices corresponding to each time point. 
+    sell_price : np.ndarray
+        An array containing the system sell prices corresponding to each time point. 
         These values should be in £/MWh. 
     
-    imbalance_cost : Iterable[float]
-        An iterable containing the imbalance costs corresponding to each time point. 
+    imbalance_cost : np.ndarray
+        An array containing the imbalance costs corresponding to each time point. 
         These values should be in £.
 
+    output_path : str or None
+        If given, the plots are saved to this file (e.g. 'report_2024-01-01.png') instead of being displayed.
+        The figure is then created without pyplot, so no interactive (GUI) backend is initialised.
+
     Returns:
     None
-        This function does not return a value. It displays the generated plots directly.
+        This function does not return a value. It displays or saves the generated plots directly.
 
     """
-    max_price = max(sell_price)
-    max_price_time = time[sell_price.idxmax()]
+    time = np.asarray(time)
+    sell_price = np.asarray(sell_price)
+    imbalance_cost = np.asarray(imbalance_cost)
+
+    max_price_index = sell_price.argmax()
+    max_price = sell_price[max_price_index]
+    max_price_time = time[max_price_index]
+
+    max_imbalance_cost_index = imbalance_cost.argmax()
+    max_imbalance_cost = imbalance_cost[max_imbalance_cost_index]
+    max_imbalance_cost_time = time[max_imbalance_cost_index]
 
-    max_imbalance_cost = max(imbalance_cost)
-    max_imbalance_cost_time = time[imbalance_cost.idxmax()]
+    if output_path is None:
+        import matplotlib.pyplot as plt
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(20, 10)) 
+    else:
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(20, 10))
+        ax1, ax2 = fig.subplots(2, 1)
 
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(20, 10)) 
     ax1.plot(time, sell_price, label='System Price', marker='x') 
     ax1.set_title(f"System Price on {settlement_date}")
     ax1.set_ylabel("£/MWh")
     ax1.set_xlabel("Settlement Period Start Time (UTC)")
     ax1.grid(True, linestyle='--', alpha=0.7)
-    ax1.annotate(f'Max: £{np.round(max_price, 2):,.2f}', xy=(max_price_time, max_price), xytext=(max_price_time, max_price * 1.1),
+    ax1.annotate(f'Max: £{max_price:,.2f}', xy=(max_price_time, max_price), xytext=(max_price_time, max_price * 1.1),
                  arrowprops=dict(facecolor='black', arrowstyle='->'), fontsize=10, color='b')
     for label in ax1.get_xticklabels():
         label.set_rotation(45)
@@ -312,11 +555,15 @@ def generate_price_and_imbalance_cost_plots(settlement_date : str, time: Iterabl
     ax2.grid(True, linestyle='--', alpha=0.7)
     for label in ax2.get_xticklabels():
         label.set_rotation(45)
-    ax2.annotate(f'Max: £{np.round(max_imbalance_cost, 2):,.2f}', xy=(max_imbalance_cost_time, max_imbalance_cost), xytext=(max_imbalance_cost_time, max_imbalance_cost * 1.1),
+    ax2.annotate(f'Max: £{max_imbalance_cost:,.2f}', xy=(max_imbalance_cost_time, max_imbalance_cost), xytext=(max_imbalance_cost_time, max_imbalance_cost * 1.1),
             arrowprops=dict(facecolor='black', arrowstyle='->'), fontsize=10, color='b')
 
     fig.tight_layout() 
-    plt.show()
+
+    if output_path is None:
+        plt.show()
+    else:
+        fig.savefig(output_path, dpi=100)
 
 
 
@@ -327,7 +574,7 @@ def generate_max_net_abs_imbalance_volume_hour(df : pd.DataFrame) -> tuple:
     Identifies the hour (UTC) with the highest absolute imbalance volumes from the given DataFrame.
 
     This function extracts the hour from the 'startTime' column, calculates the absolute values of the
-    'netImbalanceVolume' column, and groups the DataFrame by hour to sum the absolute imbalance volumes.
+    'netImbalanceVolume' column, and sums the absolute imbalance volumes into 24 hourly bins with np.bincount.
     It then identifies the hour with the highest imbalance volume and returns both the hour and the volume.
 
     Parameters:
@@ -342,16 +589,25 @@ def generate_max_net_abs_imbalance_volume_hour(df : pd.DataFrame) -> tuple:
         - int: The hour (0-23) (UTC) with the highest absolute imbalance volume.
         - float: The maximum absolute imbalance volume (in MWh).
 
+    Raises:
+    ValueError
+        If the DataFrame is empty, as there is no hour to report.
+
     Note: If local timezone is BST, the UTC hours follow the order from 23, 0, 1, ..., 22, not 0-23
     """
+    if df.empty:
+        raise ValueError("Cannot find the hour with the highest imbalance volume of an empty DataFrame")
 
-    df['Hour'] = df['startTime'].dt.hour
-    df['absNetImbalanceVolume'] = df['netImbalanceVolume'].apply(abs)
-    grouped_df = df.groupby('Hour')['absNetImbalanceVolume'].sum()
-    return(grouped_df.idxmax(), grouped_df.max())
+    hours = to_utc_nanoseconds(df['startTime']) // NANOSECONDS_PER_HOUR % 24
+    # Missing volumes count as 0, as the groupby sum would skip them
+    abs_net_imbalance_volume = np.nan_to_num(np.abs(df['netImbalanceVolume'].to_numpy()))
+    hourly_volumes = np.bincount(hours, weights=abs_net_imbalance_volume, minlength=24)
 
+    max_hour = int(hourly_volumes.argmax())
+    return(max_hour, float(hourly_volumes[max_hour]))
 
-def generate_max_abs_imbalance_volume_period_hour() -> tuple:
+
+def generate_max_abs_imbalance_volume_period_hour(df : pd.DataFrame) -> tuple:
     """
     Identifies the hour (UTC) containing the settlement period of the highest absolute imbalance volume from the given DataFrame.
 
@@ -369,16 +625,37 @@ def generate_max_abs_imbalance_volume_period_hour() -> tuple:
 
     Note: If local timezone is BST, the UTC hours follow the order from 23, 0, 1, ..., 22, not 0-23
     """
-    df['absNetImbalanceVolume'] = df['netImbalanceVolume'].apply(abs)
-    df = df.reset_index(drop = True)
+    # Missing volumes count as 0, so argmax skips them as idxmax did
+    abs_net_imbalance_volume = np.nan_to_num(np.abs(df['netImbalanceVolume'].to_numpy()))
+    max_index = abs_net_imbalance_volume.argmax()
 
-    max_abs_imbalance_vol_time = df['startTime'].iloc[df['absNetImbalanceVolume'].idxmax()]
-    max_abs_imbalance_vol_hour = max_abs_imbalance_vol_time.hour
-    max_abs_vol = df['absNetImbalanceVolume'].max()
+    max_abs_imbalance_vol_hour = df['startTime'].iloc[max_index].hour
+    max_abs_vol = float(abs_net_imbalance_volume[max_index])
 
     return(max_abs_imbalance_vol_hour, max_abs_vol)
 
 
+def calculate_imbalance_cost(df : pd.DataFrame) -> np.ndarray:
+    """
+    Calculates the imbalance cost of each settlement period based on the net imbalance volume and system prices.
+
+    If the net imbalance volume (NIV) is positive, the cost is calculated using the system sell price; 
+    if it is negative, the cost uses the system buy price.
+
+    Parameters:
+    df : pd.DataFrame
+        A DataFrame containing the 'netImbalanceVolume', 'systemSellPrice' and 'systemBuyPrice' columns.
+
+    Returns:
+    np.ndarray
+        The imbalance cost in £ for each row of the DataFrame. The DataFrame is not modified.
+    """
+    net_imbalance_volume = df['netImbalanceVolume'].to_numpy()
+    price = np.where(net_imbalance_volume > 0, df['systemSellPrice'].to_numpy(), df['systemBuyPrice'].to_numpy())
+
+    return net_imbalance_volume * price
+
+
 def calculate_total_imbalance_cost(df : pd.DataFrame) -> float:
     """
     Calculates the total imbalance cost based on the net imbalance volume and system prices.
@@ -386,7 +663,7 @@ def calculate_total_imbalance_cost(df : pd.DataFrame) -> float:
     The function computes the imbalance cost for each entry in the DataFrame by determining 
     whether the net imbalance volume (NIV) is positive or negative. If the NIV is positive, 
     the cost is calculated using the system sell price; if it is negative, the cost uses 
-    the system buy price. The function returns the sum of all calculated costs.
+    the system buy price. The function returns the sum of all calculated costs, skipping NaN costs.
 
     Parameters:
     df : pd.DataFrame
@@ -408,9 +685,8 @@ def calculate_total_imbalance_cost(df : pd.DataFrame) -> float:
       there is more supply than demand, leading to costs calculated using the 
       system buy price.
     """
-    df['ImbalanceCost'] = np.where(df['netImbalanceVolume'] > 0, df['netImbalanceVolume'] * df['systemSellPrice'], df['netImbalanceVolume'] * df['systemBuyPrice'])
-
-    total_imbalance_cost = df['ImbalanceCost'].sum()
+    # nansum, like pandas' Series.sum, skips periods with a missing volume or price
+    total_imbalance_cost = float(np.nansum(calculate_imbalance_cost(df)))
 
     return total_imbalance_cost
 
@@ -445,15 +721,15 @@ def report_max_net_abs_imbalance_volume_hour(df : pd.DataFrame) -> None:
         max_hour = 12
 
     print(f"Hour with highest absolute imbalance volumes: {max_hour}{am_pm} (UTC),",
-            f"with net absolute imbalance volume of {np.round(max_val, 2)} MWh")
+            f"with net absolute imbalance volume of {max_val:,.2f} MWh")
 
 
 def report_total_imbalance_cost(df : pd.DataFrame) -> None:
 
-    print(f"Total Daily Imbalance Cost = £{np.round(calculate_total_imbalance_cost(df), 2):,.2f}")
+    print(f"Total Daily Imbalance Cost = £{calculate_total_imbalance_cost(df):,.2f}")
 
 
-def output_report_and_plots_for_date(date: str, use_local_timezone: bool) -> None:
+def output_report_and_plots_for_date(date: str, use_local_timezone: bool, plot: bool = True, plot_path: str | None = None) -> bool:
     """
     Fetches, transforms, and reports imbalance data for a specified date, generating plots for system prices 
     and imbalance costs. The function can switch between local timezone and UTC for the date the data is obtained for.
@@ -468,14 +744,31 @@ def output_report_and_plots_for_date(date: str, use_local_timezone: bool) -> Non
         the data will be processed in the local timezone; if False, the data will be converted to 
         UTC before further processing.
 
+    plot : bool
+        A boolean flag indicating whether to generate and display the plots. If set to False,
+        only the report is printed and matplotlib is never imported.
+
+    plot_path : str or None
+        If given, the plots are saved to this file instead of being displayed.
+
     Returns:
-    None
-        This function does not return a value. It directly outputs the report and displays 
-        the generated plots.
+    bool
+        True once the report is output and the plots are generated; False if no data could be 
+        fetched for the date (e.g. a future date or an API outage), in which case an error is printed instead.
 
     """
         
-    df = fetch_and_transform_data_for_date_string(date)
+    if not use_local_timezone and ends_in_british_summer_time(date):
+        # The last UTC periods are published under the next settlement date, so fetch both at once.
+        # The next date's data is memoized and reused by add_missing_settlement_periods.
+        next_date = offset_date_string(date, 1)
+        df, _ = fetch_and_transform_data_for_date_strings([date, next_date])
+    else:
+        df = fetch_and_transform_data_for_date_string(date)
+
+    if df is None:
+        print(f"Error: could not fetch imbalance data for date: {date}, no report generated")
+        return False
 
     if not use_local_timezone:
         df = switch_timezone_to_utc(date, df)
@@ -484,10 +777,19 @@ def output_report_and_plots_for_date(date: str, use_local_timezone: bool) -> Non
 
     report_max_net_abs_imbalance_volume_hour(df)
 
-    generate_price_and_imbalance_cost_plots_from_dataframe(date, df)
+    if plot:
+        generate_price_and_imbalance_cost_plots_from_dataframe(date, df, plot_path)
+
+    return True
 
 
 
 if __name__ == "__main__":
-    date_string = "2024-01-01"
-    output_report_and_plots_for_date(date_string, use_local_timezone=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Report BMRS imbalance data for a settlement date.")
+    parser.add_argument("date", nargs="?", default="2024-01-01", help="settlement date, formatted as 'yyyy-mm-dd'")
+    parser.add_argument("--no-plot", action="store_true", help="print the report without generating plots")
+    parser.add_argument("--save-plot", metavar="PATH", help="save the plots to PATH (e.g. report.png) instead of displaying them")
+    args = parser.parse_args()
+
+    if not output_report_and_plots_for_date(args.date, use_local_timezone=True, plot=not args.no_plot, plot_path=args.save_plot):
+        sys.exit(1)
\ No newline at end of file
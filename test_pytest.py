@@ -1,130 +1,374 @@
 import pytest
-from main import fetch_data_from_api_for_date_string 
-from main import generate_max_net_abs_imbalance_volume_hour
-from main import calculate_total_imbalance_cost 
-from main import transform_data_from_api
+import main
+from main import (
+    fetch_data_from_api_for_date_string,
+    fetch_and_transform_data_for_date_string,
+    generate_max_net_abs_imbalance_volume_hour,
+    generate_max_abs_imbalance_volume_period_hour,
+    calculate_total_imbalance_cost,
+    transform_data_from_api,
+    add_missing_settlement_periods,
+    is_valid_date_string,
+    offset_date_string,
+    ends_in_british_summer_time,
+    switch_timezone_to_utc,
+    output_report_and_plots_for_date,
+)
+import json
+import re
+import requests
 import pandas as pd
 import numpy as np
 
-def test_fetch_data_from_api_for_date_string_invalid_string():
-    assert fetch_data_from_api_for_date_string("01-01-2024") is None
+from contextlib import nullcontext
+from datetime import date
 
-    assert fetch_data_from_api_for_date_string("hello") is None
+SAMPLE_PAYLOAD = {
+    'data': [
+        {
+            'settlementDate': '2024-02-01',
+            'settlementPeriod': 1,
+            'startTime': '2024-02-01T00:00:00Z',
+            'createdDateTime': '2024-02-01T00:45:03Z',
+            'systemSellPrice': 71.5,
+            'systemBuyPrice': 71.5,
+            'netImbalanceVolume': -120.3,
+            'priceDerivationCode': 'N'
+        },
+        {
+            'settlementDate': '2024-02-01',
+            'settlementPeriod': 2,
+            'startTime': '2024-02-01T00:30:00Z',
+            'createdDateTime': '2024-02-01T01:15:02Z',
+            'systemSellPrice': 68.0,
+            'systemBuyPrice': 68.0,
+            'netImbalanceVolume': 85.7,
+            'priceDerivationCode': 'N'
+        }
+    ]
+}
+SAMPLE_PAYLOAD_CONTENT = json.dumps(SAMPLE_PAYLOAD).encode()
 
-    assert fetch_data_from_api_for_date_string("2024-02-30") is None
+
+@pytest.fixture
+def mock_bmrs_api(monkeypatch):
+    """
+    Replace the Elexon API with canned responses: SAMPLE_PAYLOAD for past dates and no data for future dates.
+    Returns the list of requested URLs, so tests can check whether the API was called at all.
+    """
+    requested_urls = []
+
+    def get(url, **kwargs):
+        requested_urls.append(url)
+        response = requests.Response()
+        response.url = url
+
+        date_string = re.search(r"/system-prices/(.*)\?", url).group(1)
+        is_future = date.fromisoformat(date_string) > date.today()
+
+        response.status_code = 200
+        response._content = b'{"data": []}' if is_future else SAMPLE_PAYLOAD_CONTENT
+        return response
+
+    monkeypatch.setattr("main._SESSION.get", get)
+
+    return requested_urls
+
+
+@pytest.fixture
+def clear_fetch_cache():
+    """
+    Empty the per-date memo of fetched data before and after the test, so tests don't see each other's fetches.
+    """
+    main._fetch_and_transform_data_for_date_string_cached.cache_clear()
+    yield
+    main._fetch_and_transform_data_for_date_string_cached.cache_clear()
+
+
+@pytest.mark.parametrize("date_string", ["01-01-2024", "hello", "2024-02-30"])
+def test_fetch_data_from_api_for_date_string_invalid_string(mock_bmrs_api, date_string):
+    # Malformed dates are rejected before any request is made
+    assert fetch_data_from_api_for_date_string(date_string) is None
+    assert mock_bmrs_api == []
+
+
+def test_fetch_data_from_api_for_date_string_future_date(mock_bmrs_api, monkeypatch):
+    # A well-formed future date is requested, but the API has no data for it yet, so the empty response is not kept in the cache
+    forgotten_urls = []
+    monkeypatch.setattr("main.forget_cached_api_response", lambda response: forgotten_urls.append(response.url))
 
     assert fetch_data_from_api_for_date_string("2050-01-01") is None
+    assert len(mock_bmrs_api) == 1
+    assert forgotten_urls == mock_bmrs_api
 
 
-def test_fetch_data_from_api_for_date_string_valid_string():
- 
+def test_fetch_data_from_api_for_date_string_keeps_cached_records(mock_bmrs_api, monkeypatch):
+    forgotten_urls = []
+    monkeypatch.setattr("main.forget_cached_api_response", lambda response: forgotten_urls.append(response.url))
+
     assert fetch_data_from_api_for_date_string("2024-02-01") is not None
+    assert forgotten_urls == []
 
-    assert fetch_data_from_api_for_date_string("2020-02-01") is not None
 
+@pytest.mark.parametrize("date_string, expected", [
+    ("2024-02-29", True),
+    ("2024-01-01", True),
+    ("20240101", False),  # Accepted by date.fromisoformat, but not 'yyyy-mm-dd'
+    ("2024-1-1", False),
+    ("01-01-2024", False),
+    ("2023-02-29", False),
+    ("hello", False),
+])
+def test_is_valid_date_string(date_string, expected):
+    assert is_valid_date_string(date_string) is expected
 
-def test_generate_max_net_abs_imbalance_volume_hour():
-    # Test Case 1: Standard Case
-    data = {
-        'startTime': pd.to_datetime([
-            '2024-10-14T00:00:00Z', 
-            '2024-10-14T01:00:00Z', 
-            '2024-10-14T01:30:00Z', 
-            '2024-10-14T02:00:00Z'
-        ]),
-        'netImbalanceVolume': [5, -3, 4, 2]
-    }
-    df = pd.DataFrame(data)
-    hour, max_volume = generate_max_net_abs_imbalance_volume_hour(df)
-    assert hour == 1  # Hour with the highest absolute imbalance
-    assert max_volume == 7  # Absolute max: |-3| + |4| = 7
 
+@pytest.mark.parametrize("date_string", ["2024-02-01", "2020-02-01"])
+def test_fetch_data_from_api_for_date_string_valid_string(mock_bmrs_api, date_string):
+ 
+    df = fetch_data_from_api_for_date_string(date_string)
 
-    # Test Case 2: Single Hour
-    data = {
-        'startTime': pd.to_datetime([
-            '2024-10-14T04:00:00Z'
-        ]),
-        'netImbalanceVolume': [2]
-    }
-    df = pd.DataFrame(data)
+    assert df is not None
+    assert df.shape[0] == len(SAMPLE_PAYLOAD['data'])
+
+
+@pytest.mark.parametrize("date_string, days, expected", [
+    ("2024-07-01", 1, "2024-07-02"),
+    ("2024-07-01", -1, "2024-06-30"),
+    ("2024-02-28", 1, "2024-02-29"),
+    ("2024-12-31", 1, "2025-01-01"),
+    ("2024-03-01", -1, "2024-02-29"),
+])
+def test_offset_date_string(date_string, days, expected):
+    assert offset_date_string(date_string, days) == expected
+
+
+@pytest.mark.parametrize("date_string, expected", [
+    ("2024-03-31", True),  # Clocks go forward at 01:00 UTC, so BST by the end of the day
+    ("2024-10-27", False),  # Clocks go back at 01:00 UTC, so GMT by the end of the day
+    ("2024-07-01", True),
+    ("2024-01-15", False),
+])
+def test_ends_in_british_summer_time(date_string, expected):
+    assert ends_in_british_summer_time(date_string) is expected
+
+
+@pytest.mark.parametrize("use_local_timezone", [True, False])
+def test_output_report_and_plots_for_date_without_data(mock_bmrs_api, clear_fetch_cache, capsys, use_local_timezone):
+    # No data has been published for a future date, so no report is generated
+    assert output_report_and_plots_for_date("2050-07-01", use_local_timezone, plot=False) is False
+    assert "no report generated" in capsys.readouterr().out
+
+
+@pytest.mark.network
+def test_fetch_data_from_api_for_date_string_live():
+    # Run with `pytest -m network`; a settled date always has all 48 settlement periods.
+    # Settled dates never expire from the on-disk cache, so bypass it to make sure the API is really called.
+    cache_disabled = main._SESSION.cache_disabled() if main.requests_cache is not None else nullcontext()
+    with cache_disabled:
+        df = fetch_data_from_api_for_date_string("2024-02-01")
+
+    assert df is not None
+    assert df.shape[0] == 48
+
+
+# Naive datetime64 start times (UTC), so the fixtures can be built without parsing strings
+STANDARD_START_TIMES = np.array(['2024-10-14T00:00:00', '2024-10-14T01:00:00', '2024-10-14T01:30:00', '2024-10-14T02:00:00'], dtype='datetime64[ns]')
+SINGLE_HOUR_START_TIMES = np.array(['2024-10-14T04:00:00'], dtype='datetime64[ns]')
+NEGATIVE_START_TIMES = np.array(['2024-10-14T00:00:00', '2024-10-14T00:30:00', '2024-10-14T01:00:00', '2024-10-14T01:30:00'], dtype='datetime64[ns]')
+
+
+def make_imb_df(times, vols, dtype=np.int16):
+    """
+    Build a startTime/netImbalanceVolume frame from arrays that already have their final dtypes,
+    so pandas does not have to infer a dtype per column. The small test volumes fit in int16.
+    """
+    return pd.DataFrame({
+        'startTime': np.asarray(times, dtype='datetime64[ns]'),
+        'netImbalanceVolume': np.asarray(vols, dtype=dtype)
+    }, index=pd.RangeIndex(len(vols)))
+
+
+@pytest.fixture(scope="module")
+def standard_imbalance_df():
+    return make_imb_df(STANDARD_START_TIMES, [5, -3, 4, 2])
+
+
+@pytest.fixture(scope="module")
+def single_hour_df():
+    return make_imb_df(SINGLE_HOUR_START_TIMES, [2])
+
+
+@pytest.fixture(scope="module")
+def negative_df():
+    return make_imb_df(NEGATIVE_START_TIMES, [-1, -2, -3, -4])
+
+
+@pytest.mark.parametrize("df_fixture, expected_hour, expected_volume", [
+    ("standard_imbalance_df", 1, 7),  # Absolute max: |-3| + |4| = 7
+    ("single_hour_df", 4, 2),
+    ("negative_df", 1, 7),  # Hour 1 has the highest absolute volume: |-3| + |-4| = 7
+])
+def test_generate_max_net_abs_imbalance_volume_hour(request, df_fixture, expected_hour, expected_volume):
+    df = request.getfixturevalue(df_fixture)
     hour, max_volume = generate_max_net_abs_imbalance_volume_hour(df)
-    assert hour == 4
-    assert max_volume == 2
+    assert hour == expected_hour
+    assert max_volume == expected_volume
 
 
-    # Test Case 3: Negative Values
-    data = {
-        'startTime': pd.to_datetime([
-            '2024-10-14T00:00:00Z',
-            '2024-10-14T00:30:00Z',
-            '2024-10-14T01:00:00Z',
-            '2024-10-14T01:30:00Z'
-        ]),
-        'netImbalanceVolume': [-1, -2, -3, -4]
-    }
-    df = pd.DataFrame(data)
+def test_max_volume_hour_functions_return_plain_types(standard_imbalance_df):
+    for hour, max_volume in (generate_max_net_abs_imbalance_volume_hour(standard_imbalance_df),
+                             generate_max_abs_imbalance_volume_period_hour(standard_imbalance_df)):
+        assert type(hour) is int
+        assert type(max_volume) is float
+
+
+def test_generate_max_abs_imbalance_volume_period_hour_skips_nan():
+    df = pd.DataFrame({
+        'startTime': pd.to_datetime(['2024-10-14T00:00:00Z', '2024-10-14T05:00:00Z', '2024-10-14T07:30:00Z']),
+        'netImbalanceVolume': [np.nan, -500.0, 200.0]
+    })
+
+    assert generate_max_abs_imbalance_volume_period_hour(df) == (5, 500.0)
+
+
+def test_generate_max_net_abs_imbalance_volume_hour_empty():
+    df = make_imb_df([], [])
+
+    with pytest.raises(ValueError):
+        generate_max_net_abs_imbalance_volume_hour(df)
+
+
+def reference_max_net_abs_imbalance_volume_hour(df):
+    # Straightforward pandas groupby version, used as an oracle for the bincount implementation
+    hourly_volumes = df['netImbalanceVolume'].abs().groupby(df['startTime'].dt.hour).sum()
+    max_hour = hourly_volumes.idxmax()
+    return max_hour, hourly_volumes[max_hour]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("nan_fraction", [0.0, 0.1])
+def test_generate_max_net_abs_imbalance_volume_hour_matches_reference(seed, nan_fraction):
+    rng = np.random.default_rng(seed)
+    start_times = np.datetime64('2024-10-14T00:00:00', 'ns') + np.sort(rng.choice(48 * 7, size=200, replace=False)) * np.timedelta64(30, 'm')
+    volumes = rng.normal(0, 300, size=200)
+    # Missing volumes are skipped by the groupby sum, so they must not win (or poison) an hour
+    volumes[rng.random(200) < nan_fraction] = np.nan
+    df = pd.DataFrame({
+        'startTime': start_times,
+        'netImbalanceVolume': volumes
+    })
+
     hour, max_volume = generate_max_net_abs_imbalance_volume_hour(df)
-    assert hour == 1  # Hour 1 has the highest absolute volume of 7
-    assert max_volume == 7  # |-3| + |-4| = 7
+    expected_hour, expected_volume = reference_max_net_abs_imbalance_volume_hour(df)
+
+    assert hour == expected_hour
+    assert max_volume == pytest.approx(expected_volume, rel=1e-9)
+
+
+@pytest.fixture(scope="module", params=[1, 100, 10_000])
+def scaled_imbalance_df(request):
+    # The standard volume pattern tiled over n hours of half-hourly settlement periods
+    n_periods = 2 * request.param
+    start_times = np.datetime64('2024-10-14T00:00:00', 'ns') + np.arange(n_periods) * np.timedelta64(30, 'm')
+    volumes = np.tile([5, -3, 4, 2], n_periods // 4 + 1)[:n_periods]
+    return make_imb_df(start_times, volumes)
+
 
-    # # Test Case 4: Empty DataFrame
-    # df = pd.DataFrame(columns=['startTime', 'netImbalanceVolume'])
-    # hour, max_volume = generate_max_net_abs_imbalance_volume_hour(df)
-    # print(hour)
-    # # assert hour is None  
-    # # assert max_volume is None 
+def test_generate_max_net_abs_imbalance_volume_hour_scaled(scaled_imbalance_df):
+    hour, max_volume = generate_max_net_abs_imbalance_volume_hour(scaled_imbalance_df)
+    expected_hour, expected_volume = reference_max_net_abs_imbalance_volume_hour(scaled_imbalance_df)
+
+    assert hour == expected_hour
+    assert max_volume == expected_volume
+
+
+# Positive volumes are charged at the sell price, negative volumes at the buy price
+EXPECTED_COST_MIXED = (10 * 100) + (-5 * 180) + (15 * 150)
+EXPECTED_COST_POSITIVE = (10 * 100) + (5 * 200) + (15 * 150)
+EXPECTED_COST_NEGATIVE = (-10 * 80) + (-5 * 180) + (-15 * 120)
 
 
 def test_calculate_total_imbalance_cost():
-    # Test Case 1: Standard Case
+    # Test Case 1: Standard Case, float64 as returned by the API
     data = {
-        'netImbalanceVolume': [10, -5, 15],
-        'systemSellPrice': [100, 200, 150],
-        'systemBuyPrice': [80, 180, 120]
+        'netImbalanceVolume': np.array([10, -5, 15], dtype=np.float64),
+        'systemSellPrice': np.array([100, 200, 150], dtype=np.float64),
+        'systemBuyPrice': np.array([80, 180, 120], dtype=np.float64)
     }
 
     df = pd.DataFrame(data)
     total_cost = calculate_total_imbalance_cost(df)
-    expected_cost = (10 * 100) + (-5 * 180) + (15 * 150) 
-    assert np.isclose(total_cost, expected_cost), f"Expected {expected_cost}, got {total_cost}"
+    expected_cost = EXPECTED_COST_MIXED
+    assert total_cost == pytest.approx(expected_cost, rel=1e-9, abs=1e-9), f"Expected {expected_cost}, got {total_cost}"
 
+    # Test Cases 2 and 3 use float32 inputs; these integer-valued products are exact in float32, so the tolerance stays tight
     # Test Case 2: All Positive Values
     data = {
-        'netImbalanceVolume': [10, 5, 15],
-        'systemSellPrice': [100, 200, 150],
-        'systemBuyPrice': [80, 180, 120]
+        'netImbalanceVolume': np.array([10, 5, 15], dtype=np.float32),
+        'systemSellPrice': np.array([100, 200, 150], dtype=np.float32),
+        'systemBuyPrice': np.array([80, 180, 120], dtype=np.float32)
     }
     df = pd.DataFrame(data)
     total_cost = calculate_total_imbalance_cost(df)
-    expected_cost = (10 * 100) + (5 * 200) + (15 * 150)
-    assert np.isclose(total_cost, expected_cost), f"Expected {expected_cost}, got {total_cost}"
+    expected_cost = EXPECTED_COST_POSITIVE
+    assert total_cost == pytest.approx(expected_cost, rel=1e-9, abs=1e-9), f"Expected {expected_cost}, got {total_cost}"
 
     # Test Case 3: All Negative Values
     data = {
-        'netImbalanceVolume': [-10, -5, -15],
-        'systemSellPrice': [100, 200, 150],
-        'systemBuyPrice': [80, 180, 120]
+        'netImbalanceVolume': np.array([-10, -5, -15], dtype=np.float32),
+        'systemSellPrice': np.array([100, 200, 150], dtype=np.float32),
+        'systemBuyPrice': np.array([80, 180, 120], dtype=np.float32)
     }
     df = pd.DataFrame(data)
     total_cost = calculate_total_imbalance_cost(df)
-    expected_cost = (-10 * 80) + (-5 * 180) + (-15 * 120)
-    assert np.isclose(total_cost, expected_cost), f"Expected {expected_cost}, got {total_cost}"
+    expected_cost = EXPECTED_COST_NEGATIVE
+    assert total_cost == pytest.approx(expected_cost, rel=1e-9, abs=1e-9), f"Expected {expected_cost}, got {total_cost}"
 
 
-def test_transform_data_from_api_success():
-    # Sample data to be returned from the mock API call
-    sample_data = pd.DataFrame({
-        'settlementDate': ['2024-10-14'],
-        'settlementPeriod': [1],
-        'startTime': ['2024-10-14T23:00:00Z'],
-        'createdDateTime': ['2024-10-14T00:00:00Z'],
-        'systemSellPrice': [50.0],
-        'systemBuyPrice': [45.0],
-        'netImbalanceVolume': [10.0],
-        'unneededColumn': [10.0]
+def test_calculate_total_imbalance_cost_skips_nan():
+    # A period with a missing volume (e.g. absent from the API response) is left out of the total
+    df = pd.DataFrame({
+        'netImbalanceVolume': [np.nan, 10.0, -5.0],
+        'systemSellPrice': [100.0, 100.0, 200.0],
+        'systemBuyPrice': [80.0, 80.0, 180.0]
     })
 
+    assert calculate_total_imbalance_cost(df) == pytest.approx((10 * 100) + (-5 * 180), rel=1e-9, abs=1e-9)
+
+
+# Raw API-shaped data shared by the transform tests, including a column the transform drops
+SAMPLE_FULL = pd.DataFrame({
+    'settlementDate': ['2024-10-14'],
+    'settlementPeriod': [1],
+    'startTime': ['2024-10-14T23:00:00Z'],
+    'createdDateTime': ['2024-10-14T00:00:00Z'],
+    'systemSellPrice': [50.0],
+    'systemBuyPrice': [45.0],
+    'netImbalanceVolume': [10.0],
+    'unneededColumn': [10.0]
+})
+
+EXPECTED_TRANSFORMED_COLUMNS = ['settlementDate', 'settlementPeriod', 'startTime', 'createdDateTime',
+                                'systemSellPrice', 'systemBuyPrice', 'netImbalanceVolume']
+
+
+def test_transform_data_from_api_success():
+    result = transform_data_from_api(SAMPLE_FULL.copy())
+
+    assert list(result.columns) == EXPECTED_TRANSFORMED_COLUMNS
+    assert np.array_equal(result['settlementDate'].to_numpy(), np.array(['2024-10-14'], dtype='datetime64[ns]'))
+    assert np.array_equal(result['settlementPeriod'].to_numpy(), np.array([1]))
+    # Timezone-aware columns are compared as naive UTC datetime64 values
+    assert np.array_equal(result['startTime'].to_numpy(dtype='datetime64[ns]'), np.array(['2024-10-14T23:00:00'], dtype='datetime64[ns]'))
+    assert np.array_equal(result['createdDateTime'].to_numpy(dtype='datetime64[ns]'), np.array(['2024-10-14T00:00:00'], dtype='datetime64[ns]'))
+    assert np.array_equal(result['systemSellPrice'].to_numpy(), np.array([50.0]))
+    assert np.array_equal(result['systemBuyPrice'].to_numpy(), np.array([45.0]))
+    assert np.array_equal(result['netImbalanceVolume'].to_numpy(), np.array([10.0]))
+
+
+def test_transform_data_from_api_dtypes():
+    # Full frame comparison, so the column dtypes (including UTC timezones) are covered too
     expected_data = pd.DataFrame({
         'settlementDate': pd.to_datetime(['2024-10-14']),
         'settlementPeriod': [1],
@@ -135,23 +379,96 @@ def test_transform_data_from_api_success():
         'netImbalanceVolume': [10.0]
     })
 
-    pd.testing.assert_frame_equal(transform_data_from_api(sample_data), expected_data)
+    pd.testing.assert_frame_equal(transform_data_from_api(SAMPLE_FULL.copy()), expected_data)
 
 
 def test_transform_data_from_api_missing_columns():
-    # Sample data with missing columns
-    sample_data = {
-        'settlementDate': ['2024-10-14'],
-        'settlementPeriod': [1],
-        'startTime': ['2024-10-14T23:00:00Z'],
-        # 'createdDateTime' column is missing
-        'systemSellPrice': [50.0],
-        'systemBuyPrice': [45.0],
-        'netImbalanceVolume': [10.0]
-    }
-
-    sample_df = pd.DataFrame(sample_data)
+    # Sample data with the 'createdDateTime' column missing
+    sample_df = SAMPLE_FULL.drop(columns=['createdDateTime'])
 
     with pytest.raises(KeyError):
         transform_data_from_api(sample_df)
 
+
+def test_add_missing_settlement_periods_failed_neighbour_fetch(monkeypatch):
+    # Neighbouring settlement dates could not be fetched (e.g. API outage)
+    monkeypatch.setattr("main.fetch_and_transform_data_for_date_strings", lambda date_strings: [None for _ in date_strings])
+
+    settlement_date_df = pd.DataFrame({
+        'startTime': pd.to_datetime(['2024-07-01T00:30:00Z', '2024-07-01T01:00:00Z']),
+        'netImbalanceVolume': [10.0, -5.0]
+    })
+    missing_settlement_times = pd.DatetimeIndex(pd.to_datetime(['2024-07-01T00:00:00Z', '2024-07-01T23:30:00Z']))
+
+    result = add_missing_settlement_periods('2024-07-01', settlement_date_df, missing_settlement_times)
+
+    pd.testing.assert_frame_equal(result, settlement_date_df)
+
+
+def test_switch_timezone_to_utc_filters_rows_and_finds_missing_periods(monkeypatch):
+    passed_to_add_missing = {}
+
+    def add_missing(settlement_date, settlement_date_df, missing_settlement_times):
+        passed_to_add_missing['df'] = settlement_date_df
+        passed_to_add_missing['missing_times'] = missing_settlement_times
+        return settlement_date_df
+
+    monkeypatch.setattr("main.add_missing_settlement_periods", add_missing)
+
+    day_start_times = pd.date_range('2024-07-01T00:00:00Z', periods=48, freq='30min')
+    missing_start_times = pd.to_datetime(['2024-07-01T05:00:00Z', '2024-07-01T12:30:00Z'])
+    start_times = (
+        pd.to_datetime(['2024-06-30T23:30:00Z'])  # Before 00:00 UTC
+        .append(day_start_times.difference(missing_start_times))
+        .append(pd.to_datetime(['2024-07-01T01:00:00Z']))  # Duplicate start time
+        .append(pd.to_datetime(['2024-07-02T00:00:00Z']))  # After 23:30 UTC
+    )
+    df = pd.DataFrame({
+        'startTime': start_times,
+        'netImbalanceVolume': np.arange(len(start_times), dtype=np.float64)
+    })
+
+    result = switch_timezone_to_utc('2024-07-01', df)
+
+    expected_rows = df.iloc[1:-1]
+    pd.testing.assert_frame_equal(passed_to_add_missing['df'], expected_rows)
+    pd.testing.assert_frame_equal(result, expected_rows)
+    assert np.array_equal(passed_to_add_missing['missing_times'].to_numpy(), missing_start_times.to_numpy())
+
+
+@pytest.mark.parametrize("error", [requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError])
+def test_add_missing_settlement_periods_neighbour_fetch_raises(monkeypatch, clear_fetch_cache, error):
+    # The neighbouring settlement date request timed out, or could not connect once the retries were used up
+    def get(url, **kwargs):
+        raise error("simulated failure")
+
+    monkeypatch.setattr("main._SESSION.get", get)
+
+    settlement_date_df = pd.DataFrame({
+        'startTime': pd.to_datetime(['2024-07-01T00:30:00Z', '2024-07-01T01:00:00Z']),
+        'netImbalanceVolume': [10.0, -5.0]
+    })
+    missing_settlement_times = pd.DatetimeIndex(pd.to_datetime(['2024-07-01T00:00:00Z', '2024-07-01T23:30:00Z']))
+
+    result = add_missing_settlement_periods('2024-07-01', settlement_date_df, missing_settlement_times)
+
+    pd.testing.assert_frame_equal(result, settlement_date_df)
+
+
+def test_fetch_and_transform_data_for_date_string_retries_failed_fetch(monkeypatch, clear_fetch_cache):
+    # A failed fetch (e.g. a transient 503) must not be memoized, so the next call asks the API again
+    fetched_dates = []
+    responses = [None, pd.DataFrame(SAMPLE_PAYLOAD['data'])]
+
+    def fetch(date_string, columns=None):
+        fetched_dates.append(date_string)
+        return responses.pop(0)
+
+    monkeypatch.setattr("main.fetch_data_from_api_for_date_string", fetch)
+
+    assert fetch_and_transform_data_for_date_string('2024-02-01') is None
+    df = fetch_and_transform_data_for_date_string('2024-02-01')
+
+    assert df is not None
+    assert df.shape[0] == len(SAMPLE_PAYLOAD['data'])
+    assert fetched_dates == ['2024-02-01', '2024-02-01']